@@ -0,0 +1,229 @@
+import asyncio
+import httpx
+import logging
+import time
+from duo import parser, polling
+from duo.flow import DuoFlow
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+
+_logger = logging.getLogger(__name__)
+
+_MAX_KEEPALIVE_CONNECTIONS = 8
+_SAML_CHUNK_SIZE = 8192
+# Status polls get a short read budget since they are repeated every couple
+# of seconds anyway
+_TIMEOUT = httpx.Timeout(10, connect=3.05)
+_POLL_TIMEOUT = httpx.Timeout(2, connect=3.05)
+_FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+# The request never reached the server, so it is safe to send again
+_CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+def _encode_form(payload: dict) -> str:
+    """Form-encode a payload the same way requests does for data=."""
+    return urlencode({key: value for key, value in payload.items() if value is not None}, doseq=True)
+
+
+class AsyncDuoClient(DuoFlow):
+    """An asyncio client for handling Duo two-factor authentication with UToronto services."""
+
+    def __init__(self, username: str, password: str):
+        """
+        Initialize the async Duo client.
+
+        Args:
+            username: UToronto username
+            password: UToronto password
+        """
+        super().__init__(username, password)
+        # All retries happen in _send, so the transport makes a single attempt
+        self.session = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=_TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_keepalive_connections=_MAX_KEEPALIVE_CONNECTIONS)
+            )
+        )
+
+    async def __aenter__(self):
+        """Async context manager entry."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit - close session."""
+        await self.session.aclose()
+
+    async def authenticate(self,
+                           auth_method: str = "Duo Push",
+                           passcode: Optional[str] = None,
+                           device: str = "phone1") -> bool:
+        """
+        Perform full authentication flow with Duo.
+
+        Args:
+            auth_method: Either "Duo Push" or "Passcode"
+            passcode: Required if auth_method is "Passcode"
+            device: Device identifier for Duo Push
+
+        Returns:
+            True if authentication successful, False otherwise
+        """
+        try:
+            # Step 1: Initial login
+            if not await self._initial_login():
+                return False
+
+            # Step 2: Duo authentication
+            if not await self._duo_auth(auth_method, passcode, device):
+                return False
+
+            # Step 3: Complete SAML flow
+            if not await self._complete_saml(auth_method):
+                return False
+
+            return True
+
+        except Exception as e:
+            _logger.error("Authentication failed: %s", e)
+            return False
+
+    async def _post(self, url: str, payload: dict, timeout: httpx.Timeout = _TIMEOUT) -> httpx.Response:
+        """Send a form-encoded post request."""
+        return await self.session.post(url, content=_encode_form(payload), headers=_FORM_HEADERS, timeout=timeout)
+
+    async def _send(self,
+                    send: Callable[[], Awaitable[httpx.Response]],
+                    idempotent: bool = False,
+                    deadline: Optional[float] = None) -> Optional[httpx.Response]:
+        """
+        Send a request, retrying transient failures with backoff.
+
+        Every request is retried if the connection could not be made; only
+        idempotent ones are also retried on other transport errors and
+        RETRY_STATUSES. Returns None if the deadline passes while backing off.
+        """
+        retry = 0
+        while True:
+            try:
+                response = await send()
+                if not idempotent or response.status_code not in polling.RETRY_STATUSES or retry == polling.RETRY_TOTAL:
+                    return response
+                _logger.debug("Request failed, retrying: %s", response.status_code)
+            except httpx.TransportError as e:
+                if retry == polling.RETRY_TOTAL or not (idempotent or isinstance(e, _CONNECT_ERRORS)):
+                    raise
+                _logger.debug("Request failed, retrying: %s", e)
+
+            delay = polling.backoff_delay(retry)
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            await asyncio.sleep(delay)
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            retry += 1
+
+    async def _initial_login(self) -> bool:
+        """Perform initial login to get to Duo prompt."""
+        # Get initial page
+        response = await self._send(lambda: self.session.get(self.url), idempotent=True)
+
+        request = self._credentials_request(response.status_code, response.text)
+        if not request:
+            return False
+
+        # Submit credentials
+        credentials_url, payload = request
+        response = await self._send(lambda: self._post(credentials_url, payload))
+        response_url = str(response.url)
+
+        if not self._read_duo_frame(response_url, response.text):
+            return False
+
+        # Initialize Duo frame
+        await self._send(lambda: self._post(response_url, self._frame_init_payload()))
+        return True
+
+    async def _duo_auth(self, auth_method: str, passcode: Optional[str], device: str) -> bool:
+        """Perform Duo authentication."""
+        payload = self._prompt_payload(auth_method, passcode, device)
+        if payload is None:
+            return False
+
+        # Submit authentication request
+        response = await self._send(lambda: self._post(self._prompt_url, payload))
+
+        if not self._read_prompt_response(response.status_code, response.content):
+            return False
+
+        # Poll for authentication status
+        if not await self._poll_duo_status():
+            return False
+
+        return True
+
+    async def _poll_duo_status(self, timeout: int = 60) -> bool:
+        """Poll Duo for authentication status, checking once straight away before backing off."""
+        payload = self._status_payload()
+
+        start = time.monotonic()
+        deadline = start + timeout
+        attempt = 0
+
+        while time.monotonic() < deadline:
+            response = await self._send(lambda: self._post(self._status_url, payload, _POLL_TIMEOUT),
+                                        idempotent=True, deadline=deadline)
+            if response is None:
+                continue
+
+            result = self._read_status_response(response.status_code, response.content)
+            if result is not None:
+                return result
+
+            elapsed_ms = (time.monotonic() - start) * 1000
+            await asyncio.sleep(polling.poll_delay(attempt, elapsed_ms))
+            attempt += 1
+
+        _logger.error("Duo authentication timed out")
+        return False
+
+    async def _complete_saml(self, auth_method: str) -> bool:
+        """Complete SAML authentication flow."""
+        payload = self._exit_payload(auth_method)
+
+        # Stop reading the exit page as soon as the SAMLResponse field has arrived
+        saml_response = None
+        scanner = parser.SAMLResponseScanner()
+
+        request = self.session.build_request('POST', self._exit_url,
+                                             content=_encode_form(payload), headers=_FORM_HEADERS)
+        response = await self._send(lambda: self.session.send(request, stream=True))
+        try:
+            async for chunk in response.aiter_bytes(_SAML_CHUNK_SIZE):
+                saml_response = scanner.feed(chunk)
+                if saml_response:
+                    break
+        finally:
+            await response.aclose()
+
+        if not saml_response:
+            _logger.error("Failed to find SAML response")
+            return False
+
+        response = await self._send(lambda: self._post(self.url + self.saml_url, {'SAMLResponse': saml_response}))
+
+        return self._read_saml_completion(response.status_code)
+
+    async def access_service(self) -> httpx.Response:
+        """
+        Access a protected service after authentication.
+
+        Returns:
+            Response object
+        """
+        return await self._send(lambda: self.session.get(self.url), idempotent=True)
+
+    def get_session(self) -> httpx.AsyncClient:
+        """Get the authenticated session object."""
+        return self.session
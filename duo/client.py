@@ -1,11 +1,33 @@
 import requests as req
-import re
+import logging
+import random
+import threading
 import time
-from duo import duo_auth, saml, parser
+from duo import duo_auth, saml, parser, polling
+from duo.flow import DuoFlow
+from requests.adapters import HTTPAdapter
 from typing import Optional
+from urllib3.util.retry import Retry
 
 
-class DuoClient:
+_logger = logging.getLogger(__name__)
+
+# The flow talks to a handful of hosts (the service, the IdP and Duo); keep
+# one pool per host so their keep-alive connections are reused.
+_POOL_CONNECTIONS = 4
+_POOL_MAXSIZE = 8
+
+_SAML_CHUNK_SIZE = 8192
+
+
+class _JitteredRetry(Retry):
+    """Retry policy that sleeps a random time up to the exponential backoff (full jitter)."""
+
+    def get_backoff_time(self) -> float:
+        return random.uniform(0, min(polling.RETRY_BACKOFF_CAP, super().get_backoff_time()))
+
+
+class DuoClient(DuoFlow):
     """A client for handling Duo two-factor authentication with UToronto services."""
 
     def __init__(self, username: str, password: str):
@@ -16,18 +38,34 @@ class DuoClient:
             username: UToronto username
             password: UToronto password
         """
-        self.username = username
-        self.password = password
-        self.url = 'https://acorn.utoronto.ca/'
-        self.saml_url = 'spACS'
+        super().__init__(username, password)
         self.session = req.Session()
-        self.duo_host = None
-        self.sid = None
-        self.tx = None
-        self.txid = None
-        self.xsrf = None
-        self.akey = None
-
+        # Read and status retries only for GET; POSTs are retried only when the
+        # connection could not be made (see polling.RETRY_TOTAL)
+        adapter = HTTPAdapter(
+            pool_connections=_POOL_CONNECTIONS,
+            pool_maxsize=_POOL_MAXSIZE,
+            pool_block=False,
+            max_retries=_JitteredRetry(
+                total=polling.RETRY_TOTAL,
+                backoff_factor=polling.RETRY_BACKOFF_FACTOR,
+                status_forcelist=polling.RETRY_STATUSES,
+                allowed_methods=['GET'],
+                raise_on_status=False,
+                respect_retry_after_header=False
+            )
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Status polls retry in _get_status alone, so they get an adapter without
+        # retries of its own; it shares the pool to keep the connection to Duo
+        self._poll_adapter = HTTPAdapter(max_retries=0)
+        self._poll_adapter.poolmanager = adapter.poolmanager
+        # (connect, read) timeouts; status polls get a short read budget since
+        # they are repeated every couple of seconds anyway
+        self._timeout = (3.05, 10)
+        self._poll_timeout = (3.05, 2)
+        self._cancel = threading.Event()
 
     def __enter__(self):
         """Context manager entry."""
@@ -68,119 +106,68 @@ class DuoClient:
             return True
 
         except Exception as e:
-            print(f"Authentication failed: {e}")
+            _logger.error("Authentication failed: %s", e)
             return False
 
-    def _initial_login(self) -> bool:
-        """Perform initial login to get to Duo prompt."""
-        # Get initial page
-        url = 'https://bypass.utormfa.utoronto.ca/'
-        response = self.session.get(self.url)
-
-        if response.status_code != 200:
-            print(f"Failed to access initial URL: {response.status_code}")
-            return False
+        finally:
+            # A cancel() that arrived before or during this attempt has now
+            # taken effect; don't let it leak into the next one
+            self._cancel.clear()
 
-        # Extract CSRF token and form action
-        tokens = parser.extract_csrf_and_action(response.text)
+    def cancel(self) -> None:
+        """
+        Abort an authentication in progress, or the next one if none is running.
 
-        if not tokens:
-            print("Failed to find required form elements")
-            return False
+        Safe to call from another thread. No push is sent if this is called
+        before the Duo prompt request goes out. The status poll wakes from its
+        current delay or retry backoff right away and stops before its next
+        request; a request already in flight is left to finish or time out,
+        and the steps before the poll run to completion first.
+        """
+        self._cancel.set()
 
-        csrf_token = tokens['csrf_token']
-        relative_url = tokens['action']
+    def _cancelled(self) -> bool:
+        """Return whether cancel() has been called, logging it if so."""
+        if self._cancel.is_set():
+            _logger.info("Duo authentication cancelled")
+            return True
 
-        # Submit credentials
-        base_url = 'https://idpz.utorauth.utoronto.ca'
-        payload = {
-            'csrf_token': csrf_token,
-            'j_username': self.username,
-            'j_password': self.password,
-            '_eventId_proceed': ''
-        }
-
-        response = self.session.post(base_url + relative_url, data=payload)
-
-        # Extract session ID
-        sid_match = re.search('sid=([^&]+)', response.url)
-        if not sid_match:
-            print("Failed to extract session ID")
-            return False
+        return False
 
-        self.sid = sid_match.group(1)
+    def _initial_login(self) -> bool:
+        """Perform initial login to get to Duo prompt."""
+        # Get initial page
+        response = self.session.get(self.url, timeout=self._timeout)
 
-        # Extract Duo host from response URL
-        duo_host_match = re.search(r'https://([^/]+\.duosecurity\.com)', response.url)
-        if duo_host_match:
-            self.duo_host = duo_host_match.group(1)
-        else:
-            # Fallback to hardcoded host
-            self.duo_host = "api-832cdf07.duosecurity.com"
+        request = self._credentials_request(response.status_code, response.text)
+        if not request:
+            return False
 
-        # Parse Duo frame parameters
-        duo_tokens = parser.extract_duo_tokens(response.text)
+        # Submit credentials
+        credentials_url, payload = request
+        response = self.session.post(credentials_url, data=payload, timeout=self._timeout)
 
-        if not duo_tokens:
-            print("Failed to find Duo frame parameters")
+        if not self._read_duo_frame(response.url, response.text):
             return False
 
-        self.tx = duo_tokens['tx']
-        self.xsrf = duo_tokens['_xsrf']
-        self.akey = duo_tokens['akey']
+        self.session.mount(self._status_url, self._poll_adapter)
 
         # Initialize Duo frame
-        payload = {
-            "tx": self.tx,
-            "parent": 'None',
-            "_xsrf": self.xsrf,
-            "version": 'v4',
-            "akey": self.akey,
-            "has_session_trust_analysis_feature": False
-        }
-
-        self.session.post(response.url, data=payload)
+        self.session.post(response.url, data=self._frame_init_payload(), timeout=self._timeout)
         return True
 
     def _duo_auth(self, auth_method: str, passcode: Optional[str], device: str) -> bool:
         """Perform Duo authentication."""
-        if auth_method == "Passcode" and not passcode:
-            print("Passcode required for Passcode authentication method")
+        payload = self._prompt_payload(auth_method, passcode, device)
+        if payload is None or self._cancelled():
             return False
 
-        # Prepare authentication payload
-        payload = {
-            "device": device if auth_method == "Duo Push" else "null",
-            "factor": auth_method,
-            "postAuthDestination": "OIDC_EXIT",
-            "browser_features": {
-                "touch_supported": False,
-                "platform_authenticator_status": "available",
-                "webauthn_supported": True
-            },
-            "sid": self.sid
-        }
-
-        if auth_method == "Passcode":
-            payload["passcode"] = passcode
-
         # Submit authentication request
-        response = duo_auth.post_prompt(self.session, self.duo_host, payload)
-
-        if response.status_code != 200:
-            print(f"Duo prompt failed: {response.status_code}")
-            return False
-
-        response_data = response.json()
+        response = duo_auth.post_prompt(self.session, self._prompt_url, payload, timeout=self._timeout)
 
-        if response_data.get('stat') != 'OK':
-            print(f"Duo authentication failed: {response_data}")
+        if not self._read_prompt_response(response.status_code, response.content):
             return False
 
-        print(f"Duo status: {response_data['stat']}")
-
-        self.txid = response_data['response']['txid']
-
         # Poll for authentication status
         if not self._poll_duo_status():
             return False
@@ -188,85 +175,76 @@ class DuoClient:
         return True
 
     def _poll_duo_status(self, timeout: int = 60) -> bool:
-        """Poll Duo for authentication status."""
-        payload = {
-            'txid': self.txid,
-            'sid': self.sid
-        }
-
-        start_time = time.time()
-        last_poll = start_time
-
-        while time.time() - start_time < timeout:
-            # Poll every second
-            if time.time() - last_poll >= 1:
-                last_poll = time.time()
-
-                response = duo_auth.get_status(self.session, self.duo_host, payload)
-
-                if response.status_code != 200:
-                    print(f"Status poll failed: {response.status_code}")
-                    return False
-
-                response_data = response.json()
-
-                if response_data.get('stat') != 'OK':
-                    print(f"Status poll error: {response_data}")
-                    return False
-
-                status_code = response_data['response']['status_code']
-
-                if status_code == 'allow':
-                    print("Duo authentication approved!")
-                    return True
-                elif status_code == 'deny':
-                    print("Duo authentication denied!")
-                    return False
-                elif status_code == 'pushed':
-                    print("Waiting for Duo approval...")
-                    continue
-                else:
-                    print(f"Unknown status: {status_code}")
-
-        print("Duo authentication timed out")
+        """Poll Duo for authentication status, checking once straight away before backing off."""
+        payload = self._status_payload()
+
+        start = time.monotonic()
+        deadline = start + timeout
+        attempt = 0
+
+        while time.monotonic() < deadline:
+            if self._cancelled():
+                return False
+
+            response = self._get_status(payload, deadline)
+            if response is None:
+                continue
+
+            result = self._read_status_response(response.status_code, response.content)
+            if result is not None:
+                return result
+
+            # Returns early on cancel(); the check at the top of the loop stops polling
+            elapsed_ms = (time.monotonic() - start) * 1000
+            self._cancel.wait(polling.poll_delay(attempt, elapsed_ms))
+            attempt += 1
+
+        _logger.error("Duo authentication timed out")
         return False
 
+    def _get_status(self, payload: dict, deadline: float) -> Optional[req.Response]:
+        """Fetch the Duo status, retrying transient failures since the poll is safe to resend; None if cancelled or out of time."""
+        retry = 0
+        while True:
+            try:
+                response = duo_auth.get_status(self.session, self._status_url, payload, timeout=self._poll_timeout)
+                if response.status_code not in polling.RETRY_STATUSES or retry == polling.RETRY_TOTAL:
+                    return response
+                _logger.debug("Status poll failed, retrying: %s", response.status_code)
+            except (req.ConnectionError, req.Timeout) as e:
+                if retry == polling.RETRY_TOTAL:
+                    raise
+                _logger.debug("Status poll failed, retrying: %s", e)
+
+            # Back off no further than the deadline, then let the poll loop time out
+            delay = min(polling.backoff_delay(retry), max(deadline - time.monotonic(), 0))
+            if self._cancel.wait(delay) or time.monotonic() >= deadline:
+                return None
+            retry += 1
+
     def _complete_saml(self, auth_method: str) -> bool:
         """Complete SAML authentication flow."""
-        payload = {
-            "sid": self.sid,
-            "txid": self.txid,
-            "factor": auth_method,
-            "_xsrf": self.xsrf,
-            "dampen_choice": True
-        }
+        payload = self._exit_payload(auth_method)
 
-        response = duo_auth.post_exit(self.session, self.duo_host, payload)
+        # Stop reading the exit page as soon as the SAMLResponse field has arrived
+        saml_response = None
+        scanner = parser.SAMLResponseScanner()
 
-        saml_response = parser.extract_saml_response(response.text)
+        with duo_auth.post_exit(self.session, self._exit_url, payload, stream=True,
+                                timeout=self._timeout) as response:
+            for chunk in response.iter_content(chunk_size=_SAML_CHUNK_SIZE):
+                saml_response = scanner.feed(chunk)
+                if saml_response:
+                    break
 
         if not saml_response:
-            print("Failed to find SAML response")
+            _logger.error("Failed to find SAML response")
             return False
 
-        response = saml.web_completion(self.session, self.url + self.saml_url, saml_response)
+        response = saml.web_completion(self.session, self.url + self.saml_url, saml_response,
+                                       timeout=self._timeout)
 
-        if response.status_code != 200:
-            print(f"SAML submission failed: {response.status_code}")
-            return False
-
-        return True
-
-    def set_service(self, url: str, saml_url: str) -> None:
-        """
-        Sets a protected service that requires authentication.
-
-        Args:
-            url: URL to access
-            saml_url: URL to post
-        """
-        self.url = url
-        self.saml_url = saml_url
+        return self._read_saml_completion(response.status_code)
 
     def access_service(self) -> req.Response:
         """
@@ -275,7 +253,7 @@ class DuoClient:
         Returns:
             Response object
         """
-        return self.session.get(self.url)
+        return self.session.get(self.url, timeout=self._timeout)
 
     def get_session(self) -> req.Session:
         """Get the authenticated session object."""
@@ -1,16 +1,20 @@
 from requests import Session, Response
+from typing import Optional, Tuple
 
 
-def get_status(session: Session, duo_host: str, payload: dict[str: str]) -> Response:
+def get_status(session: Session, url: str, payload: dict[str: str],
+               timeout: Optional[Tuple[float, float]] = None) -> Response:
     """Send get request for duo prompt status"""
-    return session.post(f'https://{duo_host}/frame/v4/status', data=payload)
+    return session.post(url, data=payload, timeout=timeout)
 
 
-def post_prompt(session: Session, duo_host: str, payload: dict[str: str]) -> Response:
+def post_prompt(session: Session, url: str, payload: dict[str: str],
+                timeout: Optional[Tuple[float, float]] = None) -> Response:
     """Send post request for authentication"""
-    return session.post(f'https://{duo_host}/frame/v4/prompt', data=payload)
+    return session.post(url, data=payload, timeout=timeout)
 
 
-def post_exit(session: Session, duo_host: str, payload: dict[str: str]) -> Response:
+def post_exit(session: Session, url: str, payload: dict[str: str], stream: bool = False,
+              timeout: Optional[Tuple[float, float]] = None) -> Response:
     """Send post request for clean exit"""
-    return session.post(f'https://{duo_host}/frame/v4/oidc/exit', data=payload)
\ No newline at end of file
+    return session.post(url, data=payload, stream=stream, timeout=timeout)
\ No newline at end of file
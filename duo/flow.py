@@ -0,0 +1,204 @@
+import logging
+from duo import parser
+from typing import Optional, Tuple
+
+
+_logger = logging.getLogger(__name__)
+
+_IDP_URL = 'https://idpz.utorauth.utoronto.ca'
+_FALLBACK_DUO_HOST = 'api-832cdf07.duosecurity.com'
+
+
+class DuoFlow:
+    """
+    State and I/O-free steps of the UToronto Duo login flow.
+
+    DuoClient and AsyncDuoClient build on this and only add the HTTP calls, so
+    payloads and response handling stay identical between them.
+    """
+
+    _BROWSER_FEATURES = {
+        "touch_supported": False,
+        "platform_authenticator_status": "available",
+        "webauthn_supported": True
+    }
+
+    def __init__(self, username: str, password: str):
+        """
+        Initialize the login flow state.
+
+        Args:
+            username: UToronto username
+            password: UToronto password
+        """
+        self.username = username
+        self.password = password
+        self.url = 'https://acorn.utoronto.ca/'
+        self.saml_url = 'spACS'
+        self.duo_host = None
+        self._prompt_url = None
+        self._status_url = None
+        self._exit_url = None
+        self.sid = None
+        self.tx = None
+        self.txid = None
+        self.xsrf = None
+        self.akey = None
+
+    def set_service(self, url: str, saml_url: str) -> None:
+        """
+        Sets a protected service that requires authentication.
+
+        Args:
+            url: URL to access
+            saml_url: URL to post
+        """
+        self.url = url
+        self.saml_url = saml_url
+
+    def _credentials_request(self, status_code: int, html: str) -> Optional[Tuple[str, dict]]:
+        """Return the URL and payload for submitting credentials from the service's login page."""
+        if status_code != 200:
+            _logger.error("Failed to access initial URL: %s", status_code)
+            return None
+
+        tokens = parser.extract_csrf_and_action(html)
+
+        if not tokens:
+            _logger.error("Failed to find required form elements")
+            return None
+
+        payload = {
+            'csrf_token': tokens['csrf_token'],
+            'j_username': self.username,
+            'j_password': self.password,
+            '_eventId_proceed': ''
+        }
+
+        return _IDP_URL + tokens['action'], payload
+
+    def _read_duo_frame(self, url: str, html: str) -> bool:
+        """Record the Duo session, host and frame tokens from the page the credentials lead to."""
+        self.sid = parser.extract_sid(url)
+        if not self.sid:
+            _logger.error("Failed to extract session ID")
+            return False
+
+        # Extract Duo host from response URL, falling back to hardcoded host
+        self.duo_host = parser.extract_duo_host(url) or _FALLBACK_DUO_HOST
+        self._prompt_url = f'https://{self.duo_host}/frame/v4/prompt'
+        self._status_url = f'https://{self.duo_host}/frame/v4/status'
+        self._exit_url = f'https://{self.duo_host}/frame/v4/oidc/exit'
+
+        duo_tokens = parser.extract_duo_tokens(html)
+
+        if not duo_tokens:
+            _logger.error("Failed to find Duo frame parameters")
+            return False
+
+        self.tx = duo_tokens['tx']
+        self.xsrf = duo_tokens['_xsrf']
+        self.akey = duo_tokens['akey']
+        return True
+
+    def _frame_init_payload(self) -> dict:
+        """Build the payload that initializes the Duo frame."""
+        return {
+            "tx": self.tx,
+            "parent": 'None',
+            "_xsrf": self.xsrf,
+            "version": 'v4',
+            "akey": self.akey,
+            "has_session_trust_analysis_feature": False
+        }
+
+    def _prompt_payload(self, auth_method: str, passcode: Optional[str], device: str) -> Optional[dict]:
+        """Build the Duo prompt payload, or None if a required passcode is missing."""
+        if auth_method == "Passcode" and not passcode:
+            _logger.error("Passcode required for Passcode authentication method")
+            return None
+
+        payload = {
+            "device": device if auth_method == "Duo Push" else "null",
+            "factor": auth_method,
+            "postAuthDestination": "OIDC_EXIT",
+            "browser_features": self._BROWSER_FEATURES,
+            "sid": self.sid
+        }
+
+        if auth_method == "Passcode":
+            payload["passcode"] = passcode
+
+        return payload
+
+    def _read_prompt_response(self, status_code: int, content: bytes) -> bool:
+        """Record the transaction ID from the Duo prompt response."""
+        if status_code != 200:
+            _logger.error("Duo prompt failed: %s", status_code)
+            return False
+
+        response_data = parser.parse_json(content)
+
+        if response_data.get('stat') != 'OK':
+            _logger.error("Duo authentication failed: %s", response_data)
+            return False
+
+        _logger.debug("Duo status: %s", response_data['stat'])
+
+        self.txid = response_data['response']['txid']
+        return True
+
+    def _status_payload(self) -> dict:
+        """Build the Duo status poll payload."""
+        return {
+            'txid': self.txid,
+            'sid': self.sid
+        }
+
+    def _read_status_response(self, status_code: int, content: bytes) -> Optional[bool]:
+        """Interpret a status poll: True when approved, False when it failed or was denied, None while pending."""
+        if status_code != 200:
+            _logger.error("Status poll failed: %s", status_code)
+            return False
+
+        duo_status = parser.extract_status_code(content)
+
+        if duo_status is None:
+            response_data = parser.parse_json(content)
+
+            if response_data.get('stat') != 'OK':
+                _logger.error("Status poll error: %s", response_data)
+                return False
+
+            duo_status = response_data['response']['status_code']
+
+        if duo_status == 'allow':
+            _logger.info("Duo authentication approved!")
+            return True
+        elif duo_status == 'deny':
+            _logger.warning("Duo authentication denied!")
+            return False
+        elif duo_status == 'pushed':
+            _logger.debug("Waiting for Duo approval...")
+        else:
+            _logger.warning("Unknown status: %s", duo_status)
+
+        return None
+
+    def _exit_payload(self, auth_method: str) -> dict:
+        """Build the payload for the Duo exit request that returns the SAML response."""
+        return {
+            "sid": self.sid,
+            "txid": self.txid,
+            "factor": auth_method,
+            "_xsrf": self.xsrf,
+            "dampen_choice": True
+        }
+
+    def _read_saml_completion(self, status_code: int) -> bool:
+        """Check the result of submitting the SAML response to the service."""
+        if status_code != 200:
+            _logger.error("SAML submission failed: %s", status_code)
+            return False
+
+        return True
@@ -1,41 +1,128 @@
-from bs4 import BeautifulSoup
+import re
+from html import unescape
 from typing import Optional, Dict
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+
+# An attribute value may be double-quoted, single-quoted (either may span
+# lines) or unquoted, with optional whitespace around the '='.
+_VALUE = r"""\s*=\s*(?:"(?P<double>[^"]*)"|'(?P<single>[^']*)'|(?P<bare>[^\s"'>]+)(?=[\s>]))"""
+
+
+def _attr_is(attr: str, value: str) -> str:
+    """Build a lookahead asserting that the current tag has attr set to value."""
+    quote = attr + '_quote'
+    return rf"""(?=[^>]*\s{attr}\s*=\s*(?P<{quote}>["']?){re.escape(value)}(?P={quote})(?=[\s/>]))"""
+
+
+def _input_value_re(name: str) -> re.Pattern:
+    """Build a pattern capturing the value of the <input> with the given name."""
+    return re.compile(r'<input' + _attr_is('name', name) + r'[^>]*\svalue' + _VALUE, re.IGNORECASE)
+
+
+_CSRF_RE = _input_value_re('csrf_token')
+_ACTION_RE = re.compile(r'<form' + _attr_is('method', 'post') + r'[^>]*\saction' + _VALUE, re.IGNORECASE)
+_TX_RE = _input_value_re('tx')
+_XSRF_RE = _input_value_re('_xsrf')
+_AKEY_RE = _input_value_re('akey')
+_SAML_RE = re.compile(_input_value_re('SAMLResponse').pattern.encode(), re.IGNORECASE)
+# A match can only be completed by a closing quote, or by whatever ends a bare value
+_SAML_END_RE = re.compile(rb'["\'\s>]')
+_STAT_OK_RE = re.compile(rb'"stat"\s*:\s*"OK"')
+_STATUS_RE = re.compile(rb'"status_code"\s*:\s*"([a-z_]+)"')
+
+
+def _value(match: re.Match) -> str:
+    """Return the attribute value captured by a _VALUE match."""
+    for group in ('double', 'single', 'bare'):
+        value = match.group(group)
+        if value is not None:
+            return value
+
+
+def _search(pattern: re.Pattern, html: str) -> Optional[str]:
+    """Return the unescaped attribute value matched by pattern in html, if any."""
+    match = pattern.search(html)
+    return unescape(_value(match)) if match else None
 
 
 def extract_csrf_and_action(html: str) -> Optional[Dict[str, str]]:
     """Extract CSRF token and form action URL from login page."""
-    soup = BeautifulSoup(html, 'html.parser')
-    csrf_elem = soup.find('input', {'name': 'csrf_token'})
-    form_elem = soup.find('form', {'method': 'post'})
+    csrf_token = _search(_CSRF_RE, html)
+    action = _search(_ACTION_RE, html)
 
-    if not csrf_elem or not form_elem:
+    if csrf_token is None or action is None:
         return None
 
     return {
-        "csrf_token": csrf_elem['value'],
-        "action": form_elem['action']
+        "csrf_token": csrf_token,
+        "action": action
     }
 
 
 def extract_duo_tokens(html: str) -> Optional[Dict[str, str]]:
     """Extract tx, _xsrf, and akey from Duo form."""
-    soup = BeautifulSoup(html, 'html.parser')
-    tx = soup.find('input', {'name': 'tx'})
-    xsrf = soup.find('input', {'name': '_xsrf'})
-    akey = soup.find('input', {'name': 'akey'})
+    tx = _search(_TX_RE, html)
+    xsrf = _search(_XSRF_RE, html)
+    akey = _search(_AKEY_RE, html)
 
-    if not tx or not xsrf or not akey:
+    if tx is None or xsrf is None or akey is None:
         return None
 
     return {
-        "tx": tx['value'],
-        "_xsrf": xsrf['value'],
-        "akey": akey['value']
+        "tx": tx,
+        "_xsrf": xsrf,
+        "akey": akey
     }
 
 
-def extract_saml_response(html: str) -> Optional[str]:
-    """Extract SAMLResponse from final Duo exit page."""
-    soup = BeautifulSoup(html, 'html.parser')
-    saml_elem = soup.find('input', {'name': 'SAMLResponse'})
-    return saml_elem['value'] if saml_elem else None
\ No newline at end of file
+class SAMLResponseScanner:
+    """Find SAMLResponse in the final Duo exit page while it is still arriving."""
+
+    def __init__(self):
+        self._body = bytearray()
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """Add the next chunk of the page; return SAMLResponse once the whole field has arrived."""
+        # Earlier tags were already complete and did not match, so only the tag
+        # that was cut off by the previous chunk needs to be searched again
+        start = max(self._body.rfind(b'<'), 0)
+        self._body += chunk
+
+        if not _SAML_END_RE.search(chunk):
+            return None
+
+        match = _SAML_RE.search(self._body, start)
+        return unescape(_value(match).decode()) if match else None
+
+
+def extract_sid(url: str) -> Optional[str]:
+    """Extract the Duo session ID from the redirect URL."""
+    sid = parse_qs(urlsplit(url).query).get('sid')
+    return sid[0] if sid else None
+
+
+def extract_duo_host(url: str) -> Optional[str]:
+    """Extract the Duo API host from the redirect URL."""
+    parts = urlsplit(url)
+    host = parts.hostname
+    return host if parts.scheme == 'https' and host and host.endswith('.duosecurity.com') else None
+
+
+def extract_status_code(content: bytes) -> Optional[str]:
+    """Extract status_code from a successful Duo status response without decoding the JSON."""
+    if not _STAT_OK_RE.search(content):
+        return None
+
+    match = _STATUS_RE.search(content)
+    return match.group(1).decode() if match else None
+
+
+def parse_json(content: bytes) -> dict:
+    """Decode a JSON response body, using orjson when it is installed."""
+    return _json.loads(content)
@@ -0,0 +1,40 @@
+import random
+
+
+# Status poll schedule: a few fast polls to catch quick approvals, then a
+# ramp that flattens out at the plateau delay for slow ones. Every delay is
+# jittered so that clients started together do not poll in lockstep.
+_POLL_FAST_DELAY_MS = 200
+_POLL_FAST_ATTEMPTS = 5
+_POLL_PLATEAU_DELAY_MS = 2000
+_POLL_RAMP_UNTIL_MS = 10000
+_POLL_JITTER = 0.5
+
+
+def poll_delay(attempt: int, elapsed_ms: float) -> float:
+    """Return the delay in seconds before the next status poll."""
+    if attempt < _POLL_FAST_ATTEMPTS:
+        delay_ms = _POLL_FAST_DELAY_MS
+    elif elapsed_ms < _POLL_RAMP_UNTIL_MS:
+        progress = (elapsed_ms / _POLL_RAMP_UNTIL_MS) ** 0.7
+        delay_ms = _POLL_FAST_DELAY_MS + (_POLL_PLATEAU_DELAY_MS - _POLL_FAST_DELAY_MS) * progress
+    else:
+        delay_ms = _POLL_PLATEAU_DELAY_MS
+
+    delay_ms *= random.uniform(1 - _POLL_JITTER, 1 + _POLL_JITTER)
+    return delay_ms / 1000
+
+
+# Transient failures (connection resets, 5xx, rate limiting) are retried with
+# full-jitter exponential backoff. Only requests that are safe to resend get
+# read and status retries: GETs and the status poll. Other POSTs (credentials,
+# the push prompt) are only retried when the connection could not be made.
+RETRY_TOTAL = 4
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_CAP = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def backoff_delay(retry: int) -> float:
+    """Return a full-jitter exponential backoff delay in seconds for the given retry."""
+    return random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_FACTOR * 2 ** retry))
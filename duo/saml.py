@@ -1,10 +1,12 @@
 from requests import Session, Response
+from typing import Optional, Tuple
 
 
-def web_completion(session: Session, saml_url: str, saml_response: str) -> Response:
+def web_completion(session: Session, saml_url: str, saml_response: str,
+                   timeout: Optional[Tuple[float, float]] = None) -> Response:
     """Submit SAML response"""
     payload = {
         'SAMLResponse': saml_response
     }
 
-    return session.post(saml_url, data=payload)
+    return session.post(saml_url, data=payload, timeout=timeout)
@@ -1,8 +1,11 @@
+import logging
 from duo.client import DuoClient
 
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     username = ''
     password = ''
 